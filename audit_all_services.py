@@ -10,9 +10,13 @@ This script:
 5. Generates audit report
 """
 
+import heapq
 import sys
 import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from operator import attrgetter
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
@@ -20,15 +24,59 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 from tools.bigquery_tools import query_bigquery
 from tools.cloud_run_tools import list_cloud_run_services, get_service_details
 
+# Untracked services have no activity, so their last two fields are None
+Svc = namedtuple('Svc', 'name url days_since_last_request request_count')
+
+class Section:
+    """Collects report lines and writes them to stdout in one call."""
+
+    def __init__(self):
+        self.lines = []
+
+    def add(self, line=""):
+        self.lines.append(line)
+
+    def flush(self):
+        sys.stdout.write("\n".join(self.lines) + "\n")
+        self.lines.clear()
+
 def main():
     print("\n🔍 GCP Service Audit Report")
     print("=" * 70)
     print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 70 + "\n")
 
-    # Get all services
+    # Service listing and activity query are independent; run them concurrently
     print("📊 Fetching all Cloud Run services...")
-    all_services = list_cloud_run_services(limit=500)
+    print("📈 Analyzing service activity (last 30 days)...")
+    dormancy_threshold_days = 14
+
+    # Bucketing happens in BigQuery so rows come back pre-labelled
+    activity_query = f"""
+    SELECT
+      service_name,
+      request_count,
+      days_since_last_request,
+      CASE
+        WHEN days_since_last_request <= 7 THEN 'active'
+        WHEN days_since_last_request <= {dormancy_threshold_days} THEN 'dormant'
+        ELSE 'inactive'
+      END as bucket
+    FROM (
+      SELECT
+        service_name,
+        COUNT(*) as request_count,
+        TIMESTAMP_DIFF(CURRENT_TIMESTAMP(), MAX(timestamp), DAY) as days_since_last_request
+      FROM `truckerbooks-mvp-prod.gateway_metrics.gateway_request_logs`
+      WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 30 DAY)
+      GROUP BY service_name
+    )
+    """
+
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        services_future = ex.submit(list_cloud_run_services, limit=500)
+        activity_future = ex.submit(query_bigquery, activity_query)
+        all_services = services_future.result()
 
     if not all_services or all_services[0].get('error'):
         print(f"❌ Error fetching services: {all_services[0].get('error', 'Unknown')}")
@@ -37,69 +85,44 @@ def main():
     total_services = len(all_services)
     print(f"✓ Found {total_services} Cloud Run services\n")
 
-    # Query activity for all services
-    print("📈 Analyzing service activity (last 30 days)...")
-    activity_query = """
-    SELECT
-      service_name,
-      COUNT(*) as request_count,
-      MAX(timestamp) as last_request,
-      TIMESTAMP_DIFF(CURRENT_TIMESTAMP(), MAX(timestamp), DAY) as days_since_last_request
-    FROM `truckerbooks-mvp-prod.gateway_metrics.gateway_request_logs`
-    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 30 DAY)
-    GROUP BY service_name
-    ORDER BY days_since_last_request DESC
-    """
-
     try:
-        activity_data = query_bigquery(activity_query)
+        activity_data = activity_future.result()
         activity_map = {item['service_name']: item for item in activity_data if not item.get('error')}
     except:
         print("⚠️  Could not query activity data - some services may not be tracked")
         activity_map = {}
 
-    # Categorize services
+    # Categorize services. Buckets come labelled from BigQuery and INT64 columns
+    # arrive as Python ints, so this is one lookup and one append per service.
     active_services = []  # Traffic in last 7 days
     dormant_services = []  # Traffic 7-30 days ago
     inactive_services = []  # No traffic in 30+ days
     unknown_services = []  # Not tracked in logs
 
-    dormancy_threshold_days = 14
+    # Bind the lookup and the per-bucket append methods once, outside the loop
+    append_to = {
+        'active': active_services.append,
+        'dormant': dormant_services.append,
+        'inactive': inactive_services.append,
+    }
+    add_unknown = unknown_services.append
+    lookup_activity = activity_map.get
 
     for svc in all_services:
         svc_name = svc.get('name')
+        activity = lookup_activity(svc_name)
 
-        if svc_name in activity_map:
-            days_since = int(activity_map[svc_name].get('days_since_last_request', 999))
-
-            if days_since <= 7:
-                active_services.append({
-                    "name": svc_name,
-                    "url": svc.get('url'),
-                    "days_since_last_request": days_since,
-                    "request_count": int(activity_map[svc_name].get('request_count', 0))
-                })
-            elif days_since <= dormancy_threshold_days:
-                dormant_services.append({
-                    "name": svc_name,
-                    "url": svc.get('url'),
-                    "days_since_last_request": days_since,
-                    "request_count": int(activity_map[svc_name].get('request_count', 0))
-                })
-            else:
-                inactive_services.append({
-                    "name": svc_name,
-                    "url": svc.get('url'),
-                    "days_since_last_request": days_since,
-                    "request_count": int(activity_map[svc_name].get('request_count', 0))
-                })
-        else:
+        if activity is None:
             # Not in activity logs
-            unknown_services.append({
-                "name": svc_name,
-                "url": svc.get('url'),
-                "tracked": False
-            })
+            add_unknown(Svc(svc_name, svc.get('url'), None, None))
+            continue
+
+        append_to[activity['bucket']](Svc(
+            svc_name,
+            svc.get('url'),
+            activity['days_since_last_request'],
+            activity['request_count']
+        ))
 
     # Print summary
     print("\n📊 Service Activity Summary")
@@ -111,46 +134,54 @@ def main():
     print(f"Unknown/Untracked:     {len(unknown_services)} ({len(unknown_services)/total_services*100:.1f}%)")
     print("=" * 70 + "\n")
 
+    # Service listings can run to hundreds of lines; write each one out in a single call
+    section = Section()
+
     # Active services
     if active_services:
-        print(f"✅ Active Services ({len(active_services)})")
-        print("─" * 70)
-        for svc in sorted(active_services, key=lambda x: x['request_count'], reverse=True)[:10]:
-            print(f"  • {svc['name']}")
-            print(f"    Requests: {svc['request_count']:,} | Last: {svc['days_since_last_request']} days ago")
+        section.add(f"✅ Active Services ({len(active_services)})")
+        section.add("─" * 70)
+        for svc in heapq.nlargest(10, active_services, key=attrgetter('request_count')):
+            section.add(f"  • {svc.name}")
+            section.add(f"    Requests: {svc.request_count:,} | Last: {svc.days_since_last_request} days ago")
         if len(active_services) > 10:
-            print(f"  ... and {len(active_services) - 10} more")
-        print()
+            section.add(f"  ... and {len(active_services) - 10} more")
+        section.add()
+        section.flush()
 
     # Dormant services
     if dormant_services:
-        print(f"⚠️  Dormant Services ({len(dormant_services)}) - Review for potential removal")
-        print("─" * 70)
-        for svc in sorted(dormant_services, key=lambda x: x['days_since_last_request'], reverse=True):
-            print(f"  • {svc['name']}")
-            print(f"    Last activity: {svc['days_since_last_request']} days ago | Requests: {svc['request_count']:,}")
-        print()
+        section.add(f"⚠️  Dormant Services ({len(dormant_services)}) - Review for potential removal")
+        section.add("─" * 70)
+        dormant_services.sort(key=attrgetter('days_since_last_request'), reverse=True)
+        for svc in dormant_services:
+            section.add(f"  • {svc.name}")
+            section.add(f"    Last activity: {svc.days_since_last_request} days ago | Requests: {svc.request_count:,}")
+        section.add()
+        section.flush()
 
     # Inactive services
     if inactive_services:
-        print(f"🔴 Inactive Services ({len(inactive_services)}) - Strong candidates for removal")
-        print("─" * 70)
-        for svc in sorted(inactive_services, key=lambda x: x['days_since_last_request'], reverse=True)[:20]:
-            print(f"  • {svc['name']}")
-            print(f"    Last activity: {svc['days_since_last_request']}+ days ago | Requests: {svc['request_count']:,}")
+        section.add(f"🔴 Inactive Services ({len(inactive_services)}) - Strong candidates for removal")
+        section.add("─" * 70)
+        for svc in heapq.nlargest(20, inactive_services, key=attrgetter('days_since_last_request')):
+            section.add(f"  • {svc.name}")
+            section.add(f"    Last activity: {svc.days_since_last_request}+ days ago | Requests: {svc.request_count:,}")
         if len(inactive_services) > 20:
-            print(f"  ... and {len(inactive_services) - 20} more")
-        print()
+            section.add(f"  ... and {len(inactive_services) - 20} more")
+        section.add()
+        section.flush()
 
     # Unknown services
     if unknown_services:
-        print(f"❓ Untracked Services ({len(unknown_services)}) - Not in activity logs")
-        print("─" * 70)
+        section.add(f"❓ Untracked Services ({len(unknown_services)}) - Not in activity logs")
+        section.add("─" * 70)
         for svc in unknown_services[:15]:
-            print(f"  • {svc['name']}")
+            section.add(f"  • {svc.name}")
         if len(unknown_services) > 15:
-            print(f"  ... and {len(unknown_services) - 15} more")
-        print()
+            section.add(f"  ... and {len(unknown_services) - 15} more")
+        section.add()
+        section.flush()
 
     # Recommendations
     print("\n💡 Recommendations")
@@ -2,9 +2,100 @@
 """
 Quick Gemini CLI Demo
 """
+import hashlib
+import os
+import re
+from collections import OrderedDict
+
 import vertexai
 from vertexai.generative_models import GenerativeModel
 
+# Shared response cache (Memorystore/Redis) is used when REDIS_HOST is set
+CACHE_TTL_SECONDS = 3600
+# Prompts mentioning these words expect a fresh answer every time
+NONDETERMINISTIC_MARKERS = re.compile(r"\b(time|random)\b")
+
+
+def get_redis_client():
+    """Return a Redis client for the shared response cache, or None if not configured."""
+    host = os.getenv("REDIS_HOST")
+    if not host:
+        return None
+
+    try:
+        import redis
+    except ImportError:
+        print("⚠️  REDIS_HOST is set but redis is not installed - using local cache only")
+        return None
+
+    return redis.Redis(host=host, port=int(os.getenv("REDIS_PORT", "6379")))
+
+
+def make_generator(model, redis_client=None, maxsize=256):
+    """Return a function that streams response chunks, serving repeated prompts from cache."""
+    local_cache = OrderedDict()
+    if redis_client is not None:
+        from redis import RedisError
+
+    def redis_get(key):
+        """Look a prompt up in Redis; an unreachable server counts as a miss."""
+        if redis_client is None:
+            return None
+        try:
+            return redis_client.get(key)
+        except RedisError as e:
+            print(f"\n⚠️  Redis cache unavailable: {e}")
+            return None
+
+    def redis_set(key, text):
+        if redis_client is None:
+            return
+        try:
+            redis_client.setex(key, CACHE_TTL_SECONDS, text)
+        except RedisError as e:
+            print(f"\n⚠️  Redis cache unavailable: {e}")
+
+    def stream(prompt):
+        response = model.generate_content(
+            prompt, stream=True, generation_config={"candidate_count": 1}
+        )
+        for chunk in response:
+            yield chunk.text
+
+    def remember(key, text):
+        local_cache[key] = text
+        if len(local_cache) > maxsize:
+            local_cache.popitem(last=False)
+
+    def generate(prompt):
+        prompt = prompt.strip()
+        if NONDETERMINISTIC_MARKERS.search(prompt.lower()):
+            yield from stream(prompt)
+            return
+
+        key = f"gemini:{hashlib.sha256(prompt.encode()).hexdigest()}"
+        if key in local_cache:
+            local_cache.move_to_end(key)
+            yield local_cache[key]
+            return
+
+        cached = redis_get(key)
+        if cached is not None:
+            remember(key, cached.decode())
+            yield local_cache[key]
+            return
+
+        chunks = []
+        for text in stream(prompt):
+            chunks.append(text)
+            yield text
+
+        remember(key, "".join(chunks))
+        redis_set(key, local_cache[key])
+
+    return generate
+
+
 def main():
     print("=" * 60)
     print("GEMINI 2.0 FLASH CLI - READY TO USE")
@@ -17,6 +108,7 @@ def main():
     # Initialize Vertex AI
     vertexai.init(project="truckerbooks-mvp-prod", location="us-central1")
     model = GenerativeModel("gemini-2.0-flash-exp")
+    generate = make_generator(model, get_redis_client())
 
     while True:
         try:
@@ -32,8 +124,9 @@ def main():
 
             # Generate response
             print("\n💭 Gemini: ", end='', flush=True)
-            response = model.generate_content(user_input)
-            print(response.text)
+            for text in generate(user_input):
+                print(text, end='', flush=True)
+            print()
 
         except KeyboardInterrupt:
             print("\n\n👋 Goodbye!")
@@ -6,19 +6,14 @@ Bypasses the agent for immediate results.
 
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from tools.bigquery_tools import (
-    query_bigquery,
-    analyze_cache_performance,
-    get_top_models_usage,
-    find_expensive_queries
-)
+from tools.bigquery_tools import run_cost_dashboard
 from tools.cloud_run_tools import (
     list_cloud_run_services,
-    analyze_service_costs,
     find_dormant_services
 )
 
@@ -28,13 +23,56 @@ def print_section(title):
     print(f"  {title}")
     print(f"{'='*70}\n")
 
+def _failed_result(name, exc):
+    """Return what the task named `name` reports for its own errors, so its sections degrade."""
+    error = {"error": f"Failed to fetch {name}: {exc}"}
+    if name == "dormant":
+        return []
+    if name == "dashboard":
+        return {
+            "cache_performance": error,
+            "top_models": [error],
+            "expensive_queries": [error],
+            "service_costs": [error]
+        }
+    return [error]
+
+def fetch_all():
+    """Run the independent data fetches concurrently and return their results by name."""
+    tasks = {
+        "services": lambda: list_cloud_run_services(limit=10),
+        "dormant": lambda: find_dormant_services(min_days_inactive=7),
+        # Costs, cache, model and expensive-query metrics share one BigQuery script
+        "dashboard": lambda: run_cost_dashboard(min_cost=1.0),
+    }
+
+    with ThreadPoolExecutor(max_workers=len(tasks)) as ex:
+        futures = {name: ex.submit(fn) for name, fn in tasks.items()}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # A failed fetch only blanks its own sections; the rest of the report still prints
+                results[name] = _failed_result(name, e)
+
+    dashboard = results.pop("dashboard")
+    results["costs"] = dashboard["service_costs"]
+    results["cache_perf"] = dashboard["cache_performance"]
+    results["models"] = dashboard["top_models"]
+    results["expensive"] = dashboard["expensive_queries"]
+    return results
+
 def main():
     print("\n🚀 GCP Infrastructure Cost Analysis")
     print("=" * 70)
 
+    # Fetch everything up front; sections below only print
+    results = fetch_all()
+
     # 1. Cloud Run Services Overview
     print_section("📊 Cloud Run Services Overview")
-    services = list_cloud_run_services(limit=10)
+    services = results["services"]
     if services and not services[0].get('error'):
         print(f"Total services found: {len(services)}")
         print("\nFirst 10 services:")
@@ -46,7 +84,7 @@ def main():
 
     # 2. Service Costs Analysis
     print_section("💰 Service Costs (Last 7 Days)")
-    costs = analyze_service_costs(days=7)
+    costs = results["costs"]
     if costs and not costs[0].get('error'):
         print(f"Found {len(costs)} services with cost data:\n")
         for i, svc in enumerate(costs[:10], 1):
@@ -61,7 +99,7 @@ def main():
 
     # 3. Dormant Services
     print_section("💤 Dormant Services (No Traffic in 7 Days)")
-    dormant = find_dormant_services(min_days_inactive=7)
+    dormant = results["dormant"]
     if dormant:
         print(f"Found {len(dormant)} dormant services:\n")
         for svc in dormant[:15]:
@@ -73,14 +111,14 @@ def main():
 
     # 4. Cache Performance
     print_section("🔄 Cache Performance")
-    cache_perf = analyze_cache_performance(days=7)
+    cache_perf = results["cache_perf"]
     if cache_perf and not cache_perf.get('error'):
-        total = int(cache_perf.get('total_requests', 0))
-        hits = int(cache_perf.get('cache_hits', 0))
-        rate = float(cache_perf.get('hit_rate', 0))
-        savings = float(cache_perf.get('total_savings_usd', 0))
-        cache_lat = float(cache_perf.get('avg_cache_latency', 0))
-        miss_lat = float(cache_perf.get('avg_miss_latency', 0))
+        total = int(cache_perf.get('total_requests') or 0)
+        hits = int(cache_perf.get('cache_hits') or 0)
+        rate = float(cache_perf.get('hit_rate') or 0)
+        savings = float(cache_perf.get('total_savings_usd') or 0)
+        cache_lat = float(cache_perf.get('avg_cache_latency') or 0)
+        miss_lat = float(cache_perf.get('avg_miss_latency') or 0)
 
         print(f"Total Requests:     {total:,}")
         print(f"Cache Hits:         {hits:,}")
@@ -97,7 +135,7 @@ def main():
 
     # 5. Top AI Models Usage
     print_section("🤖 Top AI Models Usage (Last 30 Days)")
-    models = get_top_models_usage(days=30, limit=10)
+    models = results["models"]
     if models and not models[0].get('error'):
         print(f"Found {len(models)} models:\n")
         for i, model in enumerate(models, 1):
@@ -116,7 +154,7 @@ def main():
 
     # 6. Expensive Queries
     print_section("💸 Most Expensive Queries (Last 7 Days)")
-    expensive = find_expensive_queries(days=7, min_cost=1.0)
+    expensive = results["expensive"]
     if expensive and not expensive[0].get('error'):
         if len(expensive) > 0:
             print(f"Found {len(expensive)} expensive queries (>$1.00):\n")
@@ -145,7 +183,7 @@ def main():
         )
 
     if cache_perf and not cache_perf.get('error'):
-        hit_rate = float(cache_perf.get('hit_rate', 0))
+        hit_rate = float(cache_perf.get('hit_rate') or 0)
         if hit_rate < 50:
             recommendations.append(
                 f"🔸 Cache hit rate is {hit_rate:.1f}% - consider optimizing cache keys"
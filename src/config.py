@@ -31,7 +31,16 @@ class Settings(BaseSettings):
 
     # Google GenAI Configuration
     GOOGLE_API_KEY: str = ""
+    GOOGLE_API_KEYS: str = Field(
+        default="",
+        description="Comma-separated AI Studio keys; requests are spread across them round-robin. Overrides GOOGLE_API_KEY when set.",
+    )
     GEMINI_MODEL_NAME: str = "gemini-2.0-flash-exp"  # Default to latest
+    GEMINI_QPM: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Requests per minute allowed to Vertex AI Gemini before client-side throttling. Unset disables throttling.",
+    )
 
     # Agent Configuration
     AGENT_NAME: str = "AntigravityAgent"
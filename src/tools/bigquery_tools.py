@@ -4,36 +4,205 @@ These tools are auto-discovered by the agent.
 """
 
 import subprocess
-import json
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Dict, List, Optional
 
+try:
+    from google.api_core.exceptions import GoogleAPIError
+except ImportError:
+    class GoogleAPIError(Exception):
+        """Stand-in for google.api_core's base error when it is not installed."""
+
+try:
+    from google.auth.exceptions import GoogleAuthError
+except ImportError:
+    class GoogleAuthError(Exception):
+        """Stand-in for google.auth's base error when it is not installed."""
+
+try:
+    from google.cloud import bigquery
+except ImportError:
+    # Queries go straight to the BigQuery REST API instead (see _run_query_rest)
+    bigquery = None
+
+# The analytics tables are partitioned on DATE(timestamp) and request_logs is
+# clustered on (service_name, model). Every query repeats its time window as a
+# DATE(timestamp) predicate so BigQuery prunes partitions instead of scanning
+# the full history.
+#
+# Values are bound as query parameters rather than formatted into the SQL, so
+# the query text is stable across calls and BigQuery's result cache applies.
+
+# BigQuery parameter types for the Python values passed as query parameters
+_PARAM_TYPES = {bool: "BOOL", int: "INT64", float: "FLOAT64", str: "STRING"}
+
+_BIGQUERY_API = "https://bigquery.googleapis.com/bigquery/v2"
+# gcloud access tokens are valid for an hour; refresh a little before that
+_TOKEN_TTL_SECONDS = 3000
+
+# REST results arrive as strings; convert scalars the way the client library does
+_REST_CONVERTERS = {
+    "INTEGER": int,
+    "INT64": int,
+    "FLOAT": float,
+    "FLOAT64": float,
+    "NUMERIC": float,
+    "BOOLEAN": lambda v: v == "true",
+    "BOOL": lambda v: v == "true",
+    "TIMESTAMP": lambda v: datetime.fromtimestamp(float(v), tz=timezone.utc),
+}
+
+
+@lru_cache(maxsize=None)
+def _get_client(project: str) -> "bigquery.Client":
+    """Returns a BigQuery client for the project, shared across all calls."""
+    if bigquery is None:
+        raise GoogleAPIError("google-cloud-bigquery is not installed")
+    try:
+        return bigquery.Client(project=project)
+    except GoogleAuthError as e:
+        # No usable credentials; report it like any other API failure
+        raise GoogleAPIError(f"BigQuery authentication failed: {e}") from e
+
+
+def _query_parameters(params: Optional[Dict]) -> List["bigquery.ScalarQueryParameter"]:
+    """Converts a name -> value mapping into typed BigQuery scalar parameters."""
+    return [
+        bigquery.ScalarQueryParameter(name, _PARAM_TYPES[type(value)], value)
+        for name, value in (params or {}).items()
+    ]
+
+
+@lru_cache(maxsize=1)
+def _access_token(ttl_bucket: int) -> str:
+    """Fetches a gcloud access token; a new ttl_bucket forces a refresh."""
+    cmd = ["gcloud", "auth", "print-access-token"]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+@lru_cache(maxsize=1)
+def _http_client():
+    """Returns the httpx client used for REST queries, over HTTP/2 when h2 is installed."""
+    import httpx
+
+    try:
+        return httpx.Client(http2=True, timeout=120)
+    except ImportError:
+        return httpx.Client(timeout=120)
+
+
+def _convert_rest_rows(schema: Dict, rows: List[Dict]) -> List[Dict]:
+    """Turns REST API {"f": [{"v": ...}]} rows into dicts keyed by column name."""
+    fields = schema.get("fields", [])
+    converters = [_REST_CONVERTERS.get(field["type"]) for field in fields]
+
+    return [
+        {
+            field["name"]: convert(cell["v"]) if convert and cell["v"] is not None else cell["v"]
+            for field, convert, cell in zip(fields, converters, row["f"])
+        }
+        for row in rows
+    ]
+
+
+def _run_query_rest(query: str, project: str, params: Optional[Dict] = None) -> List[Dict]:
+    """Runs a query through the BigQuery REST API, for when the client library is missing."""
+    try:
+        import httpx
+    except ImportError as e:
+        raise GoogleAPIError("Neither google-cloud-bigquery nor httpx is installed") from e
+
+    body = {
+        "query": query,
+        "useLegacySql": False,
+        "useQueryCache": True,
+        "timeoutMs": 60000,
+        "parameterMode": "NAMED",
+        "queryParameters": [
+            {
+                "name": name,
+                "parameterType": {"type": _PARAM_TYPES[type(value)]},
+                "parameterValue": {"value": str(value).lower() if isinstance(value, bool) else str(value)}
+            }
+            for name, value in (params or {}).items()
+        ]
+    }
+
+    try:
+        token = _access_token(int(time.time() // _TOKEN_TTL_SECONDS))
+        client = _http_client()
+        headers = {"Authorization": f"Bearer {token}"}
+
+        response = client.post(f"{_BIGQUERY_API}/projects/{project}/queries", json=body, headers=headers)
+        response.raise_for_status()
+        page = response.json()
+
+        job = page["jobReference"]
+        results_url = f"{_BIGQUERY_API}/projects/{project}/queries/{job['jobId']}"
+        rows = []
+        while True:
+            if page.get("jobComplete"):
+                rows.extend(_convert_rest_rows(page.get("schema", {}), page.get("rows", [])))
+                if not page.get("pageToken"):
+                    return rows
+
+            query_params = {"location": job.get("location"), "timeoutMs": 60000}
+            if page.get("pageToken"):
+                query_params["pageToken"] = page["pageToken"]
+            response = client.get(results_url, params=query_params, headers=headers)
+            response.raise_for_status()
+            page = response.json()
+
+    except subprocess.CalledProcessError as e:
+        raise GoogleAPIError(f"Failed to get access token: {e.stderr}") from e
+    except FileNotFoundError as e:
+        raise GoogleAPIError("Failed to get access token: gcloud is not installed") from e
+    except httpx.HTTPStatusError as e:
+        raise GoogleAPIError(e.response.text) from e
+    except httpx.HTTPError as e:
+        raise GoogleAPIError(str(e)) from e
+
+
+def _run_query(
+    query: str, project: str = "truckerbooks-mvp-prod", params: Optional[Dict] = None
+) -> List[Dict]:
+    """Runs a query on the shared client and materializes the rows as dicts."""
+    if bigquery is None:
+        return _run_query_rest(query, project, params)
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=_query_parameters(params), use_query_cache=True
+    )
+    try:
+        rows = _get_client(project).query(query, job_config=job_config).result()
+        return [dict(row.items()) for row in rows]
+    except GoogleAuthError as e:
+        # Expired or revoked credentials surface on the first request, not at client creation
+        raise GoogleAPIError(f"BigQuery authentication failed: {e}") from e
+
 
-def query_bigquery(query: str, project: str = "truckerbooks-mvp-prod") -> List[Dict]:
+def query_bigquery(
+    query: str, project: str = "truckerbooks-mvp-prod", params: Optional[Dict] = None
+) -> List[Dict]:
     """
     Executes a BigQuery SQL query and returns results.
 
     Args:
         query: SQL query to execute (standard SQL)
         project: GCP project ID (default: truckerbooks-mvp-prod)
+        params: Named query parameters, referenced as @name in the query (default: none)
 
     Returns:
         List of result rows as dictionaries
     """
     try:
-        cmd = [
-            "bq", "query",
-            "--use_legacy_sql=false",
-            "--format=json",
-            f"--project_id={project}",
-            query
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
+        return _run_query(query, project, params)
 
-    except subprocess.CalledProcessError as e:
-        return [{"error": f"Query failed: {e.stderr}"}]
-    except json.JSONDecodeError:
-        return [{"error": "Failed to parse query results"}]
+    except GoogleAPIError as e:
+        return [{"error": f"Query failed: {e}"}]
 
 
 def list_datasets(project: str = "truckerbooks-mvp-prod") -> List[str]:
@@ -47,13 +216,9 @@ def list_datasets(project: str = "truckerbooks-mvp-prod") -> List[str]:
         List of dataset names
     """
     try:
-        cmd = ["bq", "ls", f"--project_id={project}", "--format=json"]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        datasets = json.loads(result.stdout)
-
-        return [ds.get("datasetReference", {}).get("datasetId") for ds in datasets]
+        return [ds.dataset_id for ds in _get_client(project).list_datasets()]
 
-    except (subprocess.CalledProcessError, json.JSONDecodeError):
+    except (GoogleAPIError, GoogleAuthError):
         return []
 
 
@@ -70,26 +235,18 @@ def get_table_schema(dataset: str, table: str, project: str = "truckerbooks-mvp-
         Dictionary with table schema and metadata
     """
     try:
-        cmd = [
-            "bq", "show",
-            "--format=json",
-            f"{project}:{dataset}.{table}"
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        table_info = json.loads(result.stdout)
+        table_info = _get_client(project).get_table(f"{project}.{dataset}.{table}")
 
         return {
             "dataset": dataset,
             "table": table,
-            "schema": table_info.get("schema", {}).get("fields", []),
-            "num_rows": table_info.get("numRows"),
-            "size_bytes": table_info.get("numBytes")
+            "schema": [field.to_api_repr() for field in table_info.schema],
+            "num_rows": table_info.num_rows,
+            "size_bytes": table_info.num_bytes
         }
 
-    except subprocess.CalledProcessError as e:
-        return {"error": f"Failed to get schema: {e.stderr}"}
-    except json.JSONDecodeError:
-        return {"error": "Failed to parse schema"}
+    except (GoogleAPIError, GoogleAuthError) as e:
+        return {"error": f"Failed to get schema: {e}"}
 
 
 def analyze_cache_performance(days: int = 7) -> Dict:
@@ -102,20 +259,24 @@ def analyze_cache_performance(days: int = 7) -> Dict:
     Returns:
         Dictionary with cache performance metrics
     """
-    query = f"""
+    query = """
     SELECT
       COUNT(*) as total_requests,
-      SUM(CASE WHEN cache_hit THEN 1 ELSE 0 END) as cache_hits,
-      ROUND(SUM(CASE WHEN cache_hit THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as hit_rate,
+      COUNTIF(cache_hit) as cache_hits,
+      ROUND(SAFE_DIVIDE(COUNTIF(cache_hit) * 100.0, COUNT(*)), 2) as hit_rate,
       SUM(savings) as total_savings_usd,
-      AVG(CASE WHEN cache_hit THEN latency_ms ELSE NULL END) as avg_cache_latency,
-      AVG(CASE WHEN NOT cache_hit THEN latency_ms ELSE NULL END) as avg_miss_latency
+      AVG(IF(cache_hit, latency_ms, NULL)) as avg_cache_latency,
+      AVG(IF(NOT cache_hit, latency_ms, NULL)) as avg_miss_latency
     FROM `truckerbooks-mvp-prod.cache_analytics.cache_metrics`
-    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @days DAY)
+      AND DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL @days DAY)
     """
 
-    results = query_bigquery(query)
-    return results[0] if results and not results[0].get("error") else {"error": "No data available"}
+    results = query_bigquery(query, params={"days": days})
+    # An empty window still yields one row, with NULL rates and averages
+    if not results or results[0].get("error") or not results[0].get("total_requests"):
+        return {"error": "No data available"}
+    return results[0]
 
 
 def get_top_models_usage(days: int = 30, limit: int = 10) -> List[Dict]:
@@ -129,7 +290,7 @@ def get_top_models_usage(days: int = 30, limit: int = 10) -> List[Dict]:
     Returns:
         List of models with usage statistics
     """
-    query = f"""
+    query = """
     SELECT
       model,
       COUNT(*) as request_count,
@@ -138,14 +299,15 @@ def get_top_models_usage(days: int = 30, limit: int = 10) -> List[Dict]:
       ROUND(SUM(cost), 2) as total_cost_usd,
       ROUND(AVG(latency_ms), 0) as avg_latency_ms
     FROM `truckerbooks-mvp-prod.gateway_metrics.request_logs`
-    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @days DAY)
+      AND DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL @days DAY)
       AND model IS NOT NULL
     GROUP BY model
     ORDER BY total_cost_usd DESC
-    LIMIT {limit}
+    LIMIT @limit
     """
 
-    return query_bigquery(query)
+    return query_bigquery(query, params={"days": days, "limit": limit})
 
 
 def find_expensive_queries(days: int = 7, min_cost: float = 1.0) -> List[Dict]:
@@ -159,9 +321,8 @@ def find_expensive_queries(days: int = 7, min_cost: float = 1.0) -> List[Dict]:
     Returns:
         List of expensive queries with details
     """
-    query = f"""
+    query = """
     SELECT
-      request_hash,
       model,
       input_tokens,
       output_tokens,
@@ -169,13 +330,14 @@ def find_expensive_queries(days: int = 7, min_cost: float = 1.0) -> List[Dict]:
       latency_ms,
       timestamp
     FROM `truckerbooks-mvp-prod.gateway_metrics.request_logs`
-    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)
-      AND cost >= {min_cost}
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @days DAY)
+      AND DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL @days DAY)
+      AND cost >= @min_cost
     ORDER BY cost DESC
     LIMIT 20
     """
 
-    return query_bigquery(query)
+    return query_bigquery(query, params={"days": days, "min_cost": min_cost})
 
 
 def analyze_workflow_efficiency() -> Dict:
@@ -188,13 +350,135 @@ def analyze_workflow_efficiency() -> Dict:
     query = """
     SELECT
       COUNT(*) as total_executions,
-      SUM(CASE WHEN success THEN 1 ELSE 0 END) as successful,
-      ROUND(SUM(CASE WHEN success THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as success_rate,
+      COUNTIF(success) as successful,
+      ROUND(SAFE_DIVIDE(COUNTIF(success) * 100.0, COUNT(*)), 2) as success_rate,
       ROUND(AVG(duration_ms), 0) as avg_duration_ms,
       ROUND(AVG(total_cost), 4) as avg_cost_usd
     FROM `truckerbooks-mvp-prod.workflow_analytics.workflow_training_data`
     WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 30 DAY)
+      AND DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
     """
 
     results = query_bigquery(query)
-    return results[0] if results and not results[0].get("error") else {"error": "No data available"}
+    if not results or results[0].get("error") or not results[0].get("total_executions"):
+        return {"error": "No data available"}
+    return results[0]
+
+
+def run_cost_dashboard(min_cost: float = 1.0, project: str = "truckerbooks-mvp-prod") -> Dict:
+    """
+    Computes the cost dashboard metrics with a single scan of request_logs.
+
+    The last 30 days of request_logs are copied into a temp table once, and
+    the model usage (30d), expensive request (7d) and service cost (7d)
+    breakdowns are all derived from it within one multi-statement script.
+
+    Args:
+        min_cost: Minimum cost threshold in USD for expensive requests (default: 1.0)
+        project: GCP project ID (default: truckerbooks-mvp-prod)
+
+    Returns:
+        Dictionary with cache_performance, top_models, expensive_queries and
+        service_costs, shaped like the results of the individual helpers
+    """
+    if bigquery is None:
+        # Multi-statement scripts need the client library; without it, run the
+        # per-metric helpers, which go over the REST API
+        from .cloud_run_tools import analyze_service_costs
+
+        return {
+            "cache_performance": analyze_cache_performance(days=7),
+            "top_models": get_top_models_usage(days=30, limit=10),
+            "expensive_queries": find_expensive_queries(days=7, min_cost=min_cost),
+            "service_costs": analyze_service_costs(days=7)
+        }
+
+    script = """
+    CREATE TEMP TABLE base AS
+    SELECT service_name, model, cost, latency_ms, input_tokens, output_tokens, timestamp
+    FROM `truckerbooks-mvp-prod.gateway_metrics.request_logs`
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 30 DAY)
+      AND DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY);
+
+    SELECT
+      COUNT(*) as total_requests,
+      COUNTIF(cache_hit) as cache_hits,
+      ROUND(SAFE_DIVIDE(COUNTIF(cache_hit) * 100.0, COUNT(*)), 2) as hit_rate,
+      SUM(savings) as total_savings_usd,
+      AVG(IF(cache_hit, latency_ms, NULL)) as avg_cache_latency,
+      AVG(IF(NOT cache_hit, latency_ms, NULL)) as avg_miss_latency
+    FROM `truckerbooks-mvp-prod.cache_analytics.cache_metrics`
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+      AND DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 7 DAY);
+
+    SELECT
+      model,
+      COUNT(*) as request_count,
+      SUM(input_tokens) as total_input_tokens,
+      SUM(output_tokens) as total_output_tokens,
+      ROUND(SUM(cost), 2) as total_cost_usd,
+      ROUND(AVG(latency_ms), 0) as avg_latency_ms
+    FROM base
+    WHERE model IS NOT NULL
+    GROUP BY model
+    ORDER BY total_cost_usd DESC
+    LIMIT 10;
+
+    SELECT
+      model,
+      input_tokens,
+      output_tokens,
+      cost as cost_usd,
+      latency_ms,
+      timestamp
+    FROM base
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+      AND cost >= @min_cost
+    ORDER BY cost DESC
+    LIMIT 20;
+
+    SELECT
+      service_name,
+      SUM(cost) as total_cost,
+      COUNT(*) as request_count,
+      AVG(latency_ms) as avg_latency
+    FROM base
+    WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+    GROUP BY service_name
+    ORDER BY total_cost DESC
+    LIMIT 20;
+    """
+
+    try:
+        client = _get_client(project)
+        job_config = bigquery.QueryJobConfig(query_parameters=_query_parameters({"min_cost": min_cost}))
+        job = client.query(script, job_config=job_config)
+        job.result()
+
+        # Each SELECT statement of the script runs as its own child job
+        children = sorted(client.list_jobs(parent_job=job), key=lambda child: child.created)
+        result_sets = [
+            [dict(row.items()) for row in child.result()]
+            for child in children
+            if child.statement_type == "SELECT"
+        ]
+        cache_rows, top_models, expensive_queries, service_costs = result_sets
+
+    except (GoogleAPIError, GoogleAuthError, ValueError) as e:
+        error = {"error": f"Dashboard query failed: {e}"}
+        return {
+            "cache_performance": error,
+            "top_models": [error],
+            "expensive_queries": [error],
+            "service_costs": [error]
+        }
+
+    return {
+        "cache_performance": (
+            cache_rows[0] if cache_rows and cache_rows[0].get("total_requests")
+            else {"error": "No data available"}
+        ),
+        "top_models": top_models,
+        "expensive_queries": expensive_queries,
+        "service_costs": service_costs
+    }
@@ -4,8 +4,86 @@ These tools are auto-discovered by the agent.
 """
 
 import subprocess
-import json
-from typing import Dict, List, Optional
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import ijson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .bigquery_tools import GoogleAPIError, _run_query
+
+# Pooled session so repeated health checks reuse TCP/TLS connections
+_HEALTH_CHECK_WORKERS = 32
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=_HEALTH_CHECK_WORKERS,
+    pool_maxsize=_HEALTH_CHECK_WORKERS,
+    max_retries=Retry(total=2, backoff_factor=0.2)
+))
+
+
+def _summarize_service(svc: Dict, region: str) -> Dict:
+    """Flattens a service resource from `gcloud run services list` into a summary dict."""
+    status = svc.get("status", {})
+    condition = status.get("conditions", [{}])[0]
+    spec = svc.get("spec", {}).get("template", {}).get("spec", {})
+    container = spec.get("containers", [{}])[0]
+    resources = container.get("resources", {}).get("limits", {})
+
+    return {
+        "name": svc.get("metadata", {}).get("name"),
+        "url": status.get("url"),
+        "region": region,
+        "ready": condition.get("status") == "True",
+        "memory": resources.get("memory", "unknown"),
+        "cpu": resources.get("cpu", "unknown"),
+        "image": container.get("image", "unknown"),
+        "env_vars": {e["name"]: e.get("value", "SECRET") for e in container.get("env", [])},
+        "status": condition.get("status")
+    }
+
+
+# Only the fields read by _summarize_service are requested from gcloud
+_SERVICE_FORMAT = "json(metadata.name,status.url,status.conditions,spec.template.spec.containers)"
+# How long a service listing is reused before gcloud is called again
+_SERVICE_CACHE_SECONDS = 60
+
+
+def _cached_services(region: str, limit: Optional[int] = None) -> Tuple[Dict, ...]:
+    """Returns the service listing, reusing one fetched within the last _SERVICE_CACHE_SECONDS."""
+    return _list_services(region, limit, int(time.time() // _SERVICE_CACHE_SECONDS))
+
+
+@lru_cache(maxsize=4)
+def _list_services(region: str, limit: Optional[int], ttl_bucket: int) -> Tuple[Dict, ...]:
+    """Lists services in the region; a new ttl_bucket forces a fresh gcloud call."""
+    cmd = [
+        "gcloud", "run", "services", "list",
+        f"--region={region}",
+        f"--format={_SERVICE_FORMAT}"
+    ]
+    if limit is not None:
+        cmd.append(f"--limit={limit}")
+
+    # Stream the JSON array so the full stdout is never held as one string. stderr goes
+    # to a temp file: a filled stderr pipe would block gcloud while stdout is being read
+    with tempfile.TemporaryFile() as err, subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err) as proc:
+        try:
+            services = tuple(_summarize_service(svc, region) for svc in ijson.items(proc.stdout, "item"))
+        except ijson.JSONError:
+            # A failed gcloud call leaves stdout empty; report the command error instead
+            if not proc.wait():
+                raise
+        proc.wait()
+        if proc.returncode:
+            err.seek(0)
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=err.read().decode())
+    return services
 
 
 def list_cloud_run_services(region: str = "us-central1", limit: int = 50) -> List[Dict]:
@@ -17,27 +95,14 @@ def list_cloud_run_services(region: str = "us-central1", limit: int = 50) -> Lis
         limit: Maximum number of services to return (default: 50)
 
     Returns:
-        List of service dictionaries with name, URL, and status
+        List of service dictionaries with name, URL, status and resource configuration
     """
     try:
-        cmd = [
-            "gcloud", "run", "services", "list",
-            f"--region={region}",
-            "--format=json"
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        services = json.loads(result.stdout)
-
-        return [{
-            "name": svc.get("metadata", {}).get("name"),
-            "url": svc.get("status", {}).get("url"),
-            "region": region,
-            "ready": svc.get("status", {}).get("conditions", [{}])[0].get("status") == "True"
-        } for svc in services[:limit]]
+        return [dict(svc) for svc in _cached_services(region, limit)]
 
     except subprocess.CalledProcessError as e:
         return [{"error": f"Failed to list services: {e.stderr}"}]
-    except json.JSONDecodeError:
+    except ijson.JSONError:
         return [{"error": "Failed to parse service list"}]
 
 
@@ -53,33 +118,19 @@ def get_service_details(service_name: str, region: str = "us-central1") -> Dict:
         Dictionary with service configuration and status
     """
     try:
-        cmd = [
-            "gcloud", "run", "services", "describe", service_name,
-            f"--region={region}",
-            "--format=json"
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        service = json.loads(result.stdout)
-
-        spec = service.get("spec", {}).get("template", {}).get("spec", {})
-        containers = spec.get("containers", [{}])[0]
-        resources = containers.get("resources", {}).get("limits", {})
-
-        return {
-            "name": service_name,
-            "url": service.get("status", {}).get("url"),
-            "memory": resources.get("memory", "unknown"),
-            "cpu": resources.get("cpu", "unknown"),
-            "image": containers.get("image", "unknown"),
-            "env_vars": {e["name"]: e.get("value", "SECRET") for e in containers.get("env", [])},
-            "status": service.get("status", {}).get("conditions", [{}])[0].get("status")
-        }
+        services = _cached_services(region)
 
     except subprocess.CalledProcessError as e:
         return {"error": f"Failed to get service details: {e.stderr}"}
-    except json.JSONDecodeError:
+    except ijson.JSONError:
         return {"error": "Failed to parse service details"}
 
+    for svc in services:
+        if svc["name"] == service_name:
+            return {key: svc[key] for key in ("name", "url", "memory", "cpu", "image", "env_vars", "status")}
+
+    return {"error": f"Service not found: {service_name}"}
+
 
 def check_service_health(service_url: str) -> Dict:
     """
@@ -92,8 +143,7 @@ def check_service_health(service_url: str) -> Dict:
         Dictionary with health status and response
     """
     try:
-        import requests
-        response = requests.get(f"{service_url}/health", timeout=10)
+        response = _SESSION.get(f"{service_url}/health", timeout=10)
 
         return {
             "url": service_url,
@@ -110,6 +160,23 @@ def check_service_health(service_url: str) -> Dict:
         }
 
 
+def check_services_health(service_urls: List[str]) -> List[Dict]:
+    """
+    Checks the health of several services concurrently.
+
+    Args:
+        service_urls: Full URLs of the Cloud Run services
+
+    Returns:
+        List of health results, in the same order as service_urls
+    """
+    if not service_urls:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(_HEALTH_CHECK_WORKERS, len(service_urls))) as ex:
+        return list(ex.map(check_service_health, service_urls))
+
+
 def analyze_service_costs(days: int = 7) -> List[Dict]:
     """
     Analyzes Cloud Run service costs using BigQuery.
@@ -121,57 +188,58 @@ def analyze_service_costs(days: int = 7) -> List[Dict]:
         List of services with cost information
     """
     try:
-        query = f"""
+        query = """
         SELECT
           service_name,
           SUM(cost) as total_cost,
           COUNT(*) as request_count,
           AVG(latency_ms) as avg_latency
         FROM `truckerbooks-mvp-prod.gateway_metrics.request_logs`
-        WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)
+        WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @days DAY)
+          AND DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL @days DAY)
         GROUP BY service_name
         ORDER BY total_cost DESC
         LIMIT 20
         """
 
-        cmd = ["bq", "query", "--use_legacy_sql=false", "--format=json", query]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return _run_query(query, params={"days": days})
 
-        return json.loads(result.stdout)
-
-    except subprocess.CalledProcessError:
+    except GoogleAPIError:
         return [{"error": "Failed to query cost data"}]
-    except json.JSONDecodeError:
-        return [{"error": "Failed to parse cost data"}]
 
 
-def find_dormant_services(min_days_inactive: int = 7) -> List[str]:
+def find_dormant_services(min_days_inactive: int = 7, bounded_days: int = 90) -> List[str]:
     """
     Finds Cloud Run services with no recent traffic.
 
     Args:
         min_days_inactive: Minimum days without traffic (default: 7)
+        bounded_days: How far back to look for a service's last request (default: 90)
 
     Returns:
         List of potentially dormant service names
     """
     try:
-        query = f"""
-        SELECT DISTINCT service_name
-        FROM `truckerbooks-mvp-prod.gateway_metrics.request_logs`
-        WHERE service_name NOT IN (
-          SELECT DISTINCT service_name
+        # Single partition-pruned pass: last request per service, then keep the stale ones
+        query = """
+        SELECT service_name
+        FROM (
+          SELECT service_name, MAX(timestamp) as last_seen
           FROM `truckerbooks-mvp-prod.gateway_metrics.request_logs`
-          WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {min_days_inactive} DAY)
+          WHERE DATE(timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL @bounded_days DAY)
+            AND service_name IS NOT NULL
+          GROUP BY service_name
         )
+        WHERE last_seen < TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @min_days_inactive DAY)
         LIMIT 50
         """
 
-        cmd = ["bq", "query", "--use_legacy_sql=false", "--format=json", query]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        services = json.loads(result.stdout)
+        services = _run_query(query, params={
+            "min_days_inactive": min_days_inactive,
+            "bounded_days": bounded_days
+        })
 
         return [svc["service_name"] for svc in services]
 
-    except (subprocess.CalledProcessError, json.JSONDecodeError, KeyError):
+    except (GoogleAPIError, KeyError):
         return []
@@ -1,9 +1,112 @@
 """
 Vertex AI Gemini wrapper to work alongside google.genai
 """
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
 import os
-import vertexai
-from vertexai.generative_models import GenerativeModel
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import lru_cache
+
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+logger = logging.getLogger(__name__)
+
+# vertexai (gRPC, protobuf, google-auth) is imported on first Vertex use only,
+# so AI Studio callers never pay for it
+
+# (project, location) pair vertexai.init() last ran for; init state is process-global
+_initialized_pair = None
+
+
+class _TokenBucket:
+    """Blocking token bucket allowing `rate` acquisitions per second on average"""
+
+    def __init__(self, rate):
+        self._rate = rate
+        self._capacity = max(1.0, rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+@lru_cache(maxsize=1)
+def _rate_limiter():
+    """Return the process-wide limiter that keeps Vertex calls under settings.GEMINI_QPM, or None if unset"""
+    from src.config import settings
+    if not settings.GEMINI_QPM:
+        return None
+    return _TokenBucket(settings.GEMINI_QPM / 60)
+
+
+def _throttle():
+    """Block until the rate limiter admits one more Vertex call; no-op when throttling is off"""
+    limiter = _rate_limiter()
+    if limiter is not None:
+        limiter.acquire()
+
+
+def _is_rate_limited(exc):
+    # Imported here so the module does not load google.api_core before Vertex is used
+    from google.api_core.exceptions import ResourceExhausted
+    return isinstance(exc, ResourceExhausted)
+
+
+# 429 / RESOURCE_EXHAUSTED is retried with exponential backoff and jitter
+_retry_on_rate_limit = retry(
+    retry=retry_if_exception(_is_rate_limited),
+    wait=wait_exponential_jitter(initial=1, max=32),
+    stop=stop_after_attempt(6),
+    reraise=True,
+)
+
+
+@lru_cache(maxsize=32)
+def _get_vertex_model(project_id, location, name):
+    """Return a shared GenerativeModel for the model name in a (project, location) pair"""
+    from vertexai.generative_models import GenerativeModel
+    # A full resource name pins a bare model ID to this pair, since vertexai.init state is
+    # process-global; names with a path (models/..., tuned models, endpoints) pass through
+    if "/" not in name:
+        name = f"projects/{project_id}/locations/{location}/publishers/google/models/{name}"
+    return GenerativeModel(name)
+
+
+@dataclass(slots=True)
+class _Response:
+    """Wraps a Vertex response to match the genai.Client interface"""
+
+    text: str
+
+
+@lru_cache(maxsize=1)
+def _default_project_location():
+    """Resolve the default Vertex project and region from the environment once"""
+    return (
+        os.getenv('GOOGLE_CLOUD_PROJECT', 'truckerbooks-mvp-prod'),
+        os.getenv('GOOGLE_CLOUD_REGION', 'us-central1'),
+    )
 
 
 class VertexGeminiClient:
@@ -11,28 +114,294 @@ class VertexGeminiClient:
     Wrapper to make Vertex AI Gemini compatible with google.genai.Client interface
     """
 
+    __slots__ = ('project_id', 'location', 'models')
+
     def __init__(self, project_id=None, location=None):
-        self.project_id = project_id or os.getenv('GOOGLE_CLOUD_PROJECT', 'truckerbooks-mvp-prod')
-        self.location = location or os.getenv('GOOGLE_CLOUD_REGION', 'us-central1')
+        default_project, default_location = _default_project_location()
+        self.project_id = project_id or default_project
+        self.location = location or default_location
 
-        vertexai.init(project=self.project_id, location=self.location)
-        self.models = self._Models()
+        global _initialized_pair
+        if _initialized_pair != (self.project_id, self.location):
+            import vertexai
+            vertexai.init(project=self.project_id, location=self.location)
+            _initialized_pair = (self.project_id, self.location)
+        self.models = self._Models(self.project_id, self.location, cache_dir=os.getenv('VERTEX_GEMINI_CACHE_DIR'))
 
     class _Models:
-        def generate_content(self, model, contents):
-            """Generate content using Vertex AI Gemini"""
+        __slots__ = ('_cache', '_cache_dir', '_cache_size', '_inflight', '_location', '_lock', '_project_id')
+
+        def __init__(self, project_id, location, cache_dir=None, cache_size=256):
+            self._project_id = project_id
+            self._location = location
+            # Responses keyed by (model, sha256 of contents, sample_index), least recently used first
+            self._cache = OrderedDict()
+            self._cache_size = cache_size
+            # Optional directory for sharing cached responses across processes
+            self._cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+            # Requests currently being fetched, so identical concurrent calls share one
+            self._inflight = {}
+            self._lock = threading.Lock()
+
+        def generate_content(self, model, contents, sample_index=0):
+            """
+            Generate content using Vertex AI Gemini.
+
+            Identical (model, contents) calls are answered from cache, and concurrent
+            identical calls wait on the one request already in flight. Pass distinct
+            sample_index values (e.g. 1..k for Pass@k) to draw independent samples,
+            each cached under its own key.
+            """
+            digest = hashlib.sha256(f"{model}\0{contents!r}".encode()).hexdigest()
+            key = (model, digest, sample_index)
+            response = self._lookup(key)
+            if response is not None:
+                return response
+
+            path = os.path.join(self._cache_dir, f"{digest}-{sample_index}.json") if self._cache_dir else None
+            if path and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    return self._remember(key, _Response(json.load(f)["text"]))
+
+            with self._lock:
+                # Re-check: the request may have completed since the lookup above
+                response = self._cache.get(key)
+                if response is not None:
+                    return response
+                future = self._inflight.get(key)
+                if future is None:
+                    future = self._inflight[key] = Future()
+                    leader = True
+                else:
+                    leader = False
+
+            if not leader:
+                return future.result()
+
+            try:
+                response = self._fetch(model, contents, key, path)
+                future.set_result(response)
+                return response
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        @_retry_on_rate_limit
+        def _request_text(self, model, contents):
+            return "".join(chunk.text for chunk in self.generate_content_stream(model, contents))
+
+        def _lookup(self, key):
+            with self._lock:
+                response = self._cache.get(key)
+                if response is not None:
+                    self._cache.move_to_end(key)
+                return response
+
+        def _remember(self, key, response):
+            with self._lock:
+                self._cache[key] = response
+                self._cache.move_to_end(key)
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            return response
+
+        def _fetch(self, model, contents, key, path):
+            text = self._request_text(model, contents)
+
+            if path:
+                os.makedirs(self._cache_dir, exist_ok=True)
+                # Write beside the target and rename, so other processes never read a partial file
+                fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump({"text": text}, f)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            return self._remember(key, _Response(text))
+
+        def generate_content_stream(self, model, contents):
+            """Yield response chunks as they arrive, like genai's models.generate_content_stream"""
+            _throttle()
             # Convert model name to Vertex AI format
-            vertex_model = GenerativeModel(model)
-            response = vertex_model.generate_content(contents)
+            vertex_model = _get_vertex_model(self._project_id, self._location, model)
+            for chunk in vertex_model.generate_content(contents, stream=True):
+                yield _Response(chunk.text)
+
+        def generate_content_batch(self, model, contents_list, max_concurrency=8):
+            """Generate content for independent prompts concurrently, preserving order (sync callers)"""
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(self.agenerate_content_batch(model, contents_list, max_concurrency))
+            raise RuntimeError(
+                "generate_content_batch() cannot run inside an event loop; "
+                "await agenerate_content_batch() instead"
+            )
 
-            # Wrap response to match genai.Client interface
-            class _Response:
-                def __init__(self, text):
-                    self.text = text
+        async def agenerate_content_batch(self, model, contents_list, max_concurrency=8):
+            """Generate content for independent prompts concurrently, preserving order"""
+            # Bound in-flight requests; free-tier quotas throttle at low concurrency
+            semaphore = asyncio.Semaphore(max_concurrency)
+            return await asyncio.gather(
+                *(self._agen(model, contents, semaphore) for contents in contents_list)
+            )
 
+        def generate_content_batch_job(self, model, contents_list, gcs_prefix, poll_interval=30):
+            """
+            Generate content for many text prompts through a Vertex AI batch prediction job.
+
+            Trades latency (minutes to hours) for throughput and lower cost; meant for
+            offline workloads such as bulk evaluation or labeling. The prompts are uploaded
+            as JSONL under gcs_prefix (gs://bucket/path), where the job also writes its output.
+            """
+            from google.cloud import storage
+            from vertexai.batch_prediction import BatchPredictionJob
+
+            bucket_name, _, prefix = gcs_prefix.removeprefix("gs://").partition("/")
+            prefix = f"{prefix.rstrip('/')}/{uuid.uuid4().hex}" if prefix else uuid.uuid4().hex
+            bucket = storage.Client().bucket(bucket_name)
+
+            lines = (
+                json.dumps({"request": {"contents": [{"role": "user", "parts": [{"text": text}]}]}})
+                for text in contents_list
+            )
+            bucket.blob(f"{prefix}/input.jsonl").upload_from_string(
+                "\n".join(lines), content_type="application/jsonl"
+            )
+
+            job = BatchPredictionJob.submit(
+                source_model=model,
+                input_dataset=f"gs://{bucket_name}/{prefix}/input.jsonl",
+                output_uri_prefix=f"gs://{bucket_name}/{prefix}/output",
+            )
+            while not job.has_ended:
+                time.sleep(poll_interval)
+                job.refresh()
+
+            if not job.has_succeeded:
+                raise RuntimeError(f"Batch prediction job {job.resource_name} failed: {job.error}")
+
+            # Output rows are not ordered; match them back to prompts by request text
+            positions = defaultdict(deque)
+            for i, text in enumerate(contents_list):
+                positions[text].append(i)
+
+            results = [None] * len(contents_list)
+            failed = {}
+            output_prefix = job.output_location.removeprefix(f"gs://{bucket_name}/")
+            for blob in bucket.list_blobs(prefix=output_prefix):
+                if not blob.name.endswith(".jsonl"):
+                    continue
+                for line in blob.download_as_text().splitlines():
+                    row = json.loads(line)
+                    text = row["request"]["contents"][0]["parts"][0]["text"]
+                    index = positions[text].popleft()
+                    candidates = row.get("response", {}).get("candidates", [])
+                    # Rows the job could not serve carry an error message in "status"
+                    if row.get("status") or not candidates:
+                        failed[index] = row.get("status") or "no candidates returned"
+                        continue
+                    parts = candidates[0].get("content", {}).get("parts", [])
+                    results[index] = _Response("".join(p.get("text", "") for p in parts))
+
+            failed.update({i: "missing from job output" for i, r in enumerate(results) if r is None and i not in failed})
+            if failed:
+                details = "; ".join(f"#{i}: {status}" for i, status in sorted(failed.items()))
+                raise RuntimeError(
+                    f"Batch prediction job {job.resource_name} returned no response for "
+                    f"{len(failed)} of {len(contents_list)} prompts ({details})"
+                )
+            return results
+
+        @_retry_on_rate_limit
+        async def _agen(self, model, contents, semaphore):
+            async with semaphore:
+                await asyncio.to_thread(_throttle)
+                vertex_model = _get_vertex_model(self._project_id, self._location, model)
+                response = await vertex_model.generate_content_async(contents)
             return _Response(response.text)
 
 
+@lru_cache(maxsize=8)
+def _genai_client(api_key):
+    """Return the shared google.genai client (and its connection pool) for an API key"""
+    from google import genai
+    from google.genai import types
+
+    # Let the SDK retry 429s with exponential backoff and jitter
+    retry_options = types.HttpRetryOptions(
+        attempts=6, initial_delay=1, max_delay=32, jitter=1, http_status_codes=[429]
+    )
+    return genai.Client(api_key=api_key, http_options=types.HttpOptions(retry_options=retry_options))
+
+
+class RoundRobinGenaiClient:
+    """
+    Spreads requests across several google.genai clients (one per API key) in turn,
+    so aggregate throughput scales with the number of keys
+    """
+
+    def __init__(self, clients):
+        self._clients = clients
+        self._cycle = itertools.cycle(range(len(clients)))
+        self.models = self._Models(self)
+
+    def _next_client(self):
+        return self._clients[next(self._cycle)]
+
+    class _Models:
+        def __init__(self, owner):
+            self._owner = owner
+
+        def generate_content(self, *args, **kwargs):
+            return self._owner._next_client().models.generate_content(*args, **kwargs)
+
+        def __getattr__(self, name):
+            # Any other models.* method goes to the next client as well
+            return getattr(self._owner._next_client().models, name)
+
+
+@lru_cache(maxsize=4)
+def _round_robin_client(api_keys):
+    """Return the shared round-robin client for a tuple of API keys"""
+    return RoundRobinGenaiClient([_genai_client(key) for key in api_keys])
+
+
+# Shape of a Google AI Studio API key; anything else (placeholders, typos) is
+# rejected locally instead of failing on the first network call
+_KEY_RE = re.compile(r"AIza[0-9A-Za-z_-]{35}")
+# Template value install.sh writes to .env; treated the same as an unset key
+_PLACEHOLDER_KEY = "your_api_key_here"
+
+
+@lru_cache(maxsize=4)
+def _api_keys(keys_csv, single_key):
+    """Return the configured AI Studio keys: GOOGLE_API_KEYS if set, else GOOGLE_API_KEY
+
+    Cached on the raw setting values so a malformed key is reported once per process.
+    """
+    keys = [key.strip() for key in keys_csv.split(",") if key.strip()]
+    if not keys and single_key.strip():
+        keys = [single_key.strip()]
+    keys = [key for key in keys if key != _PLACEHOLDER_KEY]
+
+    valid = tuple(key for key in keys if _KEY_RE.fullmatch(key))
+    if len(valid) < len(keys):
+        logger.warning("Ignoring %d malformed Google API key(s)", len(keys) - len(valid))
+    return valid
+
+
+@lru_cache(maxsize=4)
+def _vertex_singleton(project_id, location):
+    """Return the shared VertexGeminiClient for a (project, location) pair"""
+    return VertexGeminiClient(project_id, location)
+
+
 def get_gemini_client():
     """
     Get a Gemini client, preferring Google AI Studio but falling back to Vertex AI
@@ -40,13 +409,31 @@ def get_gemini_client():
     from src.config import settings
 
     # Try Google AI Studio first (requires API key)
-    if settings.GOOGLE_API_KEY and settings.GOOGLE_API_KEY != "your_api_key_here":
+    api_keys = _api_keys(settings.GOOGLE_API_KEYS, settings.GOOGLE_API_KEY)
+    if api_keys:
         try:
-            from google import genai
-            return genai.Client(api_key=settings.GOOGLE_API_KEY)
+            if len(api_keys) == 1:
+                return _genai_client(api_keys[0])
+            return _round_robin_client(api_keys)
         except Exception as e:
-            print(f"⚠️ Failed to init Google AI Studio client: {e}")
+            logger.warning("Failed to init Google AI Studio client: %s", e)
 
     # Fall back to Vertex AI (uses GCP credentials)
-    print("🔄 Using Vertex AI Gemini (via GCP credentials)")
-    return VertexGeminiClient()
+    logger.info("Using Vertex AI Gemini (via GCP credentials)")
+    project_id, location = _default_project_location()
+    return _vertex_singleton(project_id, location)
+
+
+def warmup(model=None):
+    """
+    Build the shared Gemini client and send a trivial request, so auth, model
+    metadata and the connection pool are ready before the first real call.
+    Call once from long-lived entrypoints at startup.
+    """
+    from src.config import settings
+
+    try:
+        client = get_gemini_client()
+        client.models.generate_content(model=model or settings.GEMINI_MODEL_NAME, contents="ok")
+    except Exception as e:
+        logger.warning("Gemini warmup failed: %s", e)
@@ -2,8 +2,18 @@
 """
 Test the full agent with Gemini via Vertex AI
 """
+import logging
 import sys
 import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=1)
+def _cached_agent():
+    """Build the agent once per process; call _cached_agent.cache_clear() for a fresh one"""
+    from src.agent import GeminiAgent
+    return GeminiAgent()
 
 # Test that the agent works end-to-end
 def test_agent():
@@ -12,10 +22,8 @@ def test_agent():
     print("=" * 60)
 
     try:
-        from src.agent import GeminiAgent
-
         print("\n✓ Importing agent...")
-        agent = GeminiAgent()
+        agent = _cached_agent()
 
         print("\n✓ Agent initialized successfully")
         print(f"  - Tools discovered: {len(agent.available_tools)}")
@@ -27,7 +35,7 @@ def test_agent():
 
         response = agent.think("What is 2 + 2? Just give me the number.")
 
-        print(f"\n✓ Agent response: {response[:200]}")
+        logger.info("\n✓ Agent response: %.200s", response)
 
         print("\n" + "=" * 60)
         print("SUCCESS! Agent is fully operational with Gemini")
@@ -41,4 +49,9 @@ def test_agent():
         return False
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
+    from src.vertex_gemini import warmup
+    warmup()
+
     test_agent()
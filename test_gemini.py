@@ -2,88 +2,96 @@
 """
 Quick test script for Gemini API access
 """
+import logging
 import os
 import sys
 
-def test_gemini_api():
-    """Test Gemini API access with Google API key"""
+logger = logging.getLogger(__name__)
+
+def _probe(make_generate, label):
+    """Send a one-line prompt through a client and report whether it answered"""
     try:
-        from google import genai
-        from src.config import settings
+        # Client libraries are imported inside the factory, so only the probed one loads
+        generate = make_generate()
 
+        print(f"\n🔄 Testing {label}...")
+        text = generate(f"Say 'Hello from {label}!' and nothing else.")
+
+        logger.info("✓ Response received: %.100s", text)
+        print("\n" + "=" * 60)
+        print(f"SUCCESS! {label} is working correctly.")
         print("=" * 60)
-        print("GEMINI SETUP TEST")
-        print("=" * 60)
+        return True
 
-        # Check configuration
-        print(f"\n✓ Model configured: {settings.GEMINI_MODEL_NAME}")
-        print(f"✓ API key present: {bool(settings.GOOGLE_API_KEY)}")
+    except Exception as e:
+        print(f"\n❌ {label} test failed: {str(e)}")
+        return False
 
-        if not settings.GOOGLE_API_KEY:
-            print("\n❌ ERROR: GOOGLE_API_KEY not set in .env")
-            print("\nTo fix this:")
-            print("1. Visit https://aistudio.google.com/app/apikey")
-            print("2. Create a free API key")
-            print("3. Add to .env: GOOGLE_API_KEY=your_key_here")
-            return False
+def _ai_studio_generate(api_key, model):
+    from google import genai
 
-        # Test API connection
-        print(f"\n🔄 Testing connection to {settings.GEMINI_MODEL_NAME}...")
+    client = genai.Client(api_key=api_key)
+    return lambda prompt: client.models.generate_content(model=model, contents=prompt).text
 
-        client = genai.Client(api_key=settings.GOOGLE_API_KEY)
-        response = client.models.generate_content(
-            model=settings.GEMINI_MODEL_NAME,
-            contents="Say 'Hello from Gemini!' and nothing else."
-        )
+def _vertex_generate(project_id, location, model):
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
 
-        print(f"✓ Response received: {response.text[:100]}")
-        print("\n" + "=" * 60)
-        print("SUCCESS! Gemini is working correctly.")
-        print("=" * 60)
-        return True
+    vertexai.init(project=project_id, location=location)
+    vertex_model = GenerativeModel(model)
+    return lambda prompt: vertex_model.generate_content(prompt).text
 
-    except Exception as e:
-        print(f"\n❌ ERROR: {str(e)}")
+def test_gemini_api():
+    """Test Gemini API access with Google API key"""
+    from src.config import settings
+
+    print("=" * 60)
+    print("GEMINI SETUP TEST")
+    print("=" * 60)
+
+    # Check configuration
+    print(f"\n✓ Model configured: {settings.GEMINI_MODEL_NAME}")
+    print(f"✓ API key present: {bool(settings.GOOGLE_API_KEY)}")
+
+    if not settings.GOOGLE_API_KEY:
+        print("\n❌ ERROR: GOOGLE_API_KEY not set in .env")
+        print("\nTo fix this:")
+        print("1. Visit https://aistudio.google.com/app/apikey")
+        print("2. Create a free API key")
+        print("3. Add to .env: GOOGLE_API_KEY=your_key_here")
+        return False
+
+    success = _probe(
+        lambda: _ai_studio_generate(settings.GOOGLE_API_KEY, settings.GEMINI_MODEL_NAME),
+        "Gemini",
+    )
+    if not success:
         print("\nPossible issues:")
         print("- Invalid or expired API key")
         print("- Network connectivity")
         print("- Model name incorrect")
-        return False
+    return success
 
 def test_vertex_ai():
     """Test Vertex AI access with GCP credentials"""
-    try:
-        print("\n" + "=" * 60)
-        print("TESTING VERTEX AI (Alternative)")
-        print("=" * 60)
-
-        import vertexai
-        from vertexai.generative_models import GenerativeModel
-
-        project_id = os.getenv('GOOGLE_CLOUD_PROJECT', 'truckerbooks-mvp-prod')
-        location = os.getenv('GOOGLE_CLOUD_REGION', 'us-central1')
-
-        print(f"\n✓ Project: {project_id}")
-        print(f"✓ Region: {location}")
+    print("\n" + "=" * 60)
+    print("TESTING VERTEX AI (Alternative)")
+    print("=" * 60)
 
-        vertexai.init(project=project_id, location=location)
+    project_id = os.getenv('GOOGLE_CLOUD_PROJECT', 'truckerbooks-mvp-prod')
+    location = os.getenv('GOOGLE_CLOUD_REGION', 'us-central1')
 
-        print(f"\n🔄 Testing Vertex AI Gemini...")
+    print(f"\n✓ Project: {project_id}")
+    print(f"✓ Region: {location}")
 
-        model = GenerativeModel("gemini-2.0-flash-exp")
-        response = model.generate_content("Say 'Hello from Vertex AI Gemini!' and nothing else.")
-
-        print(f"✓ Response: {response.text[:100]}")
-        print("\n" + "=" * 60)
-        print("SUCCESS! Vertex AI Gemini is working!")
-        print("=" * 60)
-        return True
-
-    except Exception as e:
-        print(f"\n❌ Vertex AI test failed: {str(e)}")
-        return False
+    return _probe(
+        lambda: _vertex_generate(project_id, location, "gemini-2.0-flash-exp"),
+        "Vertex AI Gemini",
+    )
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
     # Try Google AI Studio first (free tier)
     success = test_gemini_api()
 
@@ -0,0 +1,75 @@
+import importlib
+import sys
+import types
+from unittest.mock import MagicMock
+
+import pytest
+
+
+class FakeRedisError(Exception):
+    """Stands in for redis.RedisError, since redis is an optional dependency."""
+
+
+@pytest.fixture
+def demo(monkeypatch):
+    """Imports demo_gemini with stand-in vertexai and redis packages."""
+    generative_models = types.ModuleType("vertexai.generative_models")
+    generative_models.GenerativeModel = MagicMock()
+    vertexai = types.ModuleType("vertexai")
+    vertexai.generative_models = generative_models
+    monkeypatch.setitem(sys.modules, "vertexai", vertexai)
+    monkeypatch.setitem(sys.modules, "vertexai.generative_models", generative_models)
+    monkeypatch.setitem(sys.modules, "redis", types.SimpleNamespace(RedisError=FakeRedisError))
+    monkeypatch.delitem(sys.modules, "demo_gemini", raising=False)
+    return importlib.import_module("demo_gemini")
+
+
+@pytest.fixture
+def model():
+    """A model whose streamed reply numbers each request."""
+    model = MagicMock()
+    model.generate_content.side_effect = lambda prompt, **kwargs: [
+        types.SimpleNamespace(text=f"reply {model.generate_content.call_count}")
+    ]
+    return model
+
+
+def test_repeated_prompt_served_from_cache(demo, model):
+    """Test that a repeated prompt is answered locally without a second request."""
+    generate = demo.make_generator(model)
+
+    assert "".join(generate("Hello")) == "reply 1"
+    assert "".join(generate("  Hello ")) == "reply 1"
+    assert model.generate_content.call_count == 1
+
+
+def test_marker_words_bypass_cache(demo, model):
+    """Test that only whole-word markers skip the cache."""
+    generate = demo.make_generator(model)
+
+    assert "".join(generate("what time is it")) == "reply 1"
+    assert "".join(generate("what time is it")) == "reply 2"
+    assert "".join(generate("explain timeouts")) == "reply 3"
+    assert "".join(generate("explain timeouts")) == "reply 3"
+
+
+def test_unreachable_redis_falls_back_to_model(demo, model):
+    """Test that Redis errors are treated as misses and the reply is still cached locally."""
+    redis_client = MagicMock()
+    redis_client.get.side_effect = FakeRedisError("down")
+    redis_client.setex.side_effect = FakeRedisError("down")
+    generate = demo.make_generator(model, redis_client)
+
+    assert "".join(generate("Hello")) == "reply 1"
+    assert "".join(generate("Hello")) == "reply 1"
+    assert model.generate_content.call_count == 1
+
+
+def test_redis_hit_skips_model(demo, model):
+    """Test that a reply cached in Redis is served without calling the model."""
+    redis_client = MagicMock()
+    redis_client.get.return_value = b"shared reply"
+    generate = demo.make_generator(model, redis_client)
+
+    assert "".join(generate("Hello")) == "shared reply"
+    model.generate_content.assert_not_called()
@@ -0,0 +1,282 @@
+import os
+import sys
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from google.auth.exceptions import DefaultCredentialsError, RefreshError
+
+from src.tools import bigquery_tools, cloud_run_tools
+
+
+@pytest.fixture
+def bigquery_client():
+    """Patches the BigQuery client class; the shared per-project client cache is reset around it."""
+    bigquery_tools._get_client.cache_clear()
+    with patch.object(bigquery_tools.bigquery, "Client") as client_cls:
+        yield client_cls
+    bigquery_tools._get_client.cache_clear()
+
+
+def test_missing_credentials_return_error_results(bigquery_client):
+    """Test that helpers report missing credentials through their usual error results."""
+    bigquery_client.side_effect = DefaultCredentialsError("no ADC")
+
+    assert bigquery_tools.query_bigquery("SELECT 1")[0]["error"].startswith("Query failed")
+    assert bigquery_tools.list_datasets() == []
+    assert "error" in bigquery_tools.get_table_schema("dataset", "table")
+    assert cloud_run_tools.analyze_service_costs() == [{"error": "Failed to query cost data"}]
+    assert cloud_run_tools.find_dormant_services() == []
+
+
+def test_expired_credentials_return_error_results(bigquery_client):
+    """Test that a token refresh failure during the query is reported, not raised."""
+    client = bigquery_client.return_value
+    client.query.return_value.result.side_effect = RefreshError("expired")
+    client.list_datasets.side_effect = RefreshError("expired")
+    client.get_table.side_effect = RefreshError("expired")
+
+    with pytest.raises(bigquery_tools.GoogleAPIError, match="authentication failed"):
+        bigquery_tools._run_query("SELECT 1")
+    assert bigquery_tools.query_bigquery("SELECT 1")[0]["error"].startswith("Query failed")
+    assert bigquery_tools.list_datasets() == []
+    assert "error" in bigquery_tools.get_table_schema("dataset", "table")
+
+
+def _child_job(created, statement_type, rows):
+    child = MagicMock(created=created, statement_type=statement_type)
+    child.result.return_value = [MagicMock(items=MagicMock(return_value=row.items())) for row in rows]
+    return child
+
+
+def test_run_cost_dashboard_maps_select_children_in_order(bigquery_client):
+    """Test that the script's SELECT child jobs are matched to metrics by creation order."""
+    bigquery_client.return_value.list_jobs.return_value = [
+        _child_job(4, "SELECT", [{"service_name": "api"}]),
+        _child_job(2, "SELECT", [{"model": "flash"}]),
+        _child_job(0, "CREATE_TABLE_AS_SELECT", [{"ignored": True}]),
+        _child_job(3, "SELECT", [{"model": "pro", "cost_usd": 3.0}]),
+        _child_job(1, "SELECT", [{"total_requests": 10}]),
+    ]
+
+    dashboard = bigquery_tools.run_cost_dashboard()
+
+    assert dashboard == {
+        "cache_performance": {"total_requests": 10},
+        "top_models": [{"model": "flash"}],
+        "expensive_queries": [{"model": "pro", "cost_usd": 3.0}],
+        "service_costs": [{"service_name": "api"}],
+    }
+
+
+def test_run_cost_dashboard_reports_auth_failure(bigquery_client):
+    """Test that an expired token degrades every dashboard metric to an error result."""
+    bigquery_client.return_value.query.return_value.result.side_effect = RefreshError("expired")
+
+    dashboard = bigquery_tools.run_cost_dashboard()
+
+    assert "error" in dashboard["cache_performance"]
+    assert "error" in dashboard["service_costs"][0]
+
+
+def test_fetch_all_keeps_sections_of_failed_tasks():
+    """Test that one failed fetch leaves the other report sections intact."""
+    import run_cost_analysis
+
+    with patch.object(run_cost_analysis, "list_cloud_run_services", return_value=[{"name": "api"}]), \
+            patch.object(run_cost_analysis, "find_dormant_services", side_effect=RuntimeError("boom")), \
+            patch.object(run_cost_analysis, "run_cost_dashboard", side_effect=RuntimeError("boom")):
+        results = run_cost_analysis.fetch_all()
+
+    assert results["services"] == [{"name": "api"}]
+    assert results["dormant"] == []
+    assert "error" in results["cache_perf"]
+    assert "error" in results["costs"][0]
+
+
+def test_summarize_service_flattens_resource():
+    """Test that a gcloud service resource is flattened into the summary dict."""
+    svc = {
+        "metadata": {"name": "api"},
+        "status": {"url": "https://api.run.app", "conditions": [{"status": "True"}]},
+        "spec": {"template": {"spec": {"containers": [{
+            "image": "gcr.io/p/api",
+            "resources": {"limits": {"memory": "512Mi", "cpu": "1"}},
+            "env": [{"name": "MODE", "value": "prod"}, {"name": "TOKEN"}],
+        }]}}},
+    }
+
+    assert cloud_run_tools._summarize_service(svc, "us-central1") == {
+        "name": "api",
+        "url": "https://api.run.app",
+        "region": "us-central1",
+        "ready": True,
+        "memory": "512Mi",
+        "cpu": "1",
+        "image": "gcr.io/p/api",
+        "env_vars": {"MODE": "prod", "TOKEN": "SECRET"},
+        "status": "True",
+    }
+
+
+@pytest.fixture
+def listed_services():
+    services = tuple(
+        cloud_run_tools._summarize_service({"metadata": {"name": name}}, "us-central1")
+        for name in ("api", "worker")
+    )
+    with patch.object(cloud_run_tools, "_list_services", return_value=services) as mock_list:
+        yield mock_list
+
+
+def test_get_service_details_filters_listing(listed_services):
+    """Test that service details come from the shared listing, filtered by name."""
+    details = cloud_run_tools.get_service_details("worker")
+
+    assert details["name"] == "worker"
+    assert "region" not in details
+    assert listed_services.call_args.args[:2] == ("us-central1", None)
+
+
+def test_get_service_details_not_found(listed_services):
+    """Test that an unknown service name is reported as an error."""
+    assert cloud_run_tools.get_service_details("missing") == {"error": "Service not found: missing"}
+
+
+def test_cached_services_expire_with_time_bucket(listed_services):
+    """Test that the listing is requested again once its TTL bucket rolls over."""
+    ttl = cloud_run_tools._SERVICE_CACHE_SECONDS
+    with patch.object(cloud_run_tools.time, "time", side_effect=[10 * ttl, 10 * ttl + 1, 11 * ttl]):
+        for _ in range(3):
+            cloud_run_tools.get_service_details("api")
+
+    buckets = [call.args[2] for call in listed_services.call_args_list]
+    assert buckets == [10, 10, 11]
+
+
+@pytest.fixture
+def fake_gcloud(tmp_path, monkeypatch):
+    """Puts a scripted `gcloud` first on PATH; the returned function sets its body."""
+    script = tmp_path / "gcloud"
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    cloud_run_tools._list_services.cache_clear()
+
+    def write(body):
+        script.write_text(f"#!/bin/sh\n{body}\n")
+        script.chmod(0o755)
+
+    yield write
+    cloud_run_tools._list_services.cache_clear()
+
+
+def test_list_services_streams_past_large_stderr(fake_gcloud):
+    """Test that warnings larger than a pipe buffer do not stall reading the listing."""
+    fake_gcloud(
+        "head -c 200000 /dev/zero | tr '\\0' w >&2\n"
+        "echo '[{\"metadata\": {\"name\": \"api\"}}, {\"metadata\": {\"name\": \"worker\"}}]'"
+    )
+
+    services = cloud_run_tools.list_cloud_run_services()
+
+    assert [svc["name"] for svc in services] == ["api", "worker"]
+
+
+def test_list_services_reports_gcloud_failure(fake_gcloud):
+    """Test that a non-zero gcloud exit is reported with its stderr."""
+    fake_gcloud("echo 'ERROR: permission denied' >&2\nexit 1")
+
+    services = cloud_run_tools.list_cloud_run_services()
+
+    assert services == [{"error": "Failed to list services: ERROR: permission denied\n"}]
+
+
+def _rest_page(rows, page_token=None, complete=True):
+    page = {
+        "jobReference": {"jobId": "job-1", "location": "US"},
+        "jobComplete": complete,
+        "schema": {"fields": [{"name": "model", "type": "STRING"}, {"name": "calls", "type": "INTEGER"}]},
+        "rows": [{"f": [{"v": model}, {"v": str(calls)}]} for model, calls in rows],
+    }
+    if page_token:
+        page["pageToken"] = page_token
+    return page
+
+
+def _response(page):
+    response = MagicMock()
+    response.json.return_value = page
+    return response
+
+
+def test_convert_rest_rows_types_and_nulls():
+    """Test that REST cells are converted by column type and NULLs pass through."""
+    schema = {"fields": [
+        {"name": "n", "type": "INTEGER"},
+        {"name": "cost", "type": "FLOAT"},
+        {"name": "ok", "type": "BOOLEAN"},
+        {"name": "name", "type": "STRING"},
+    ]}
+    rows = [
+        {"f": [{"v": "3"}, {"v": "1.5"}, {"v": "true"}, {"v": "svc"}]},
+        {"f": [{"v": None}, {"v": None}, {"v": "false"}, {"v": None}]},
+    ]
+
+    assert bigquery_tools._convert_rest_rows(schema, rows) == [
+        {"n": 3, "cost": 1.5, "ok": True, "name": "svc"},
+        {"n": None, "cost": None, "ok": False, "name": None},
+    ]
+
+
+def test_run_query_rest_follows_pages():
+    """Test that the REST fallback polls until complete and collects every page."""
+    client = MagicMock()
+    client.post.return_value = _response(_rest_page([], complete=False))
+    client.get.side_effect = [
+        _response(_rest_page([("flash", 2)], page_token="p2")),
+        _response(_rest_page([("pro", 1)])),
+    ]
+
+    with patch.object(bigquery_tools, "_access_token", return_value="token"), \
+            patch.object(bigquery_tools, "_http_client", return_value=client):
+        rows = bigquery_tools._run_query_rest("SELECT 1", "proj", params={"days": 7})
+
+    assert rows == [{"model": "flash", "calls": 2}, {"model": "pro", "calls": 1}]
+    body = client.post.call_args.kwargs["json"]
+    assert body["queryParameters"][0]["parameterValue"] == {"value": "7"}
+    assert "pageToken" not in client.get.call_args_list[0].kwargs["params"]
+    assert client.get.call_args_list[1].kwargs["params"]["pageToken"] == "p2"
+
+
+@pytest.fixture
+def rest_fallback(monkeypatch):
+    """Runs queries as if google-cloud-bigquery were not installed."""
+    monkeypatch.setattr(bigquery_tools, "bigquery", None)
+    bigquery_tools._access_token.cache_clear()
+    yield
+    bigquery_tools._access_token.cache_clear()
+
+
+def test_rest_fallback_without_gcloud(rest_fallback, monkeypatch, tmp_path):
+    """Test that a missing gcloud binary is reported as a query error."""
+    monkeypatch.setenv("PATH", str(tmp_path))
+
+    assert bigquery_tools.query_bigquery("SELECT 1") == [
+        {"error": "Query failed: Failed to get access token: gcloud is not installed"}
+    ]
+
+
+def test_rest_fallback_without_httpx(rest_fallback, monkeypatch):
+    """Test that a missing httpx is reported as a query error."""
+    monkeypatch.setitem(sys.modules, "httpx", None)
+
+    assert bigquery_tools.query_bigquery("SELECT 1")[0]["error"].startswith("Query failed: Neither")
+
+
+def test_run_cost_dashboard_rest_fallback_uses_helpers(rest_fallback):
+    """Test that without the client library the dashboard is built from per-metric queries."""
+    with patch.object(bigquery_tools, "_run_query_rest", return_value=[{"total_requests": 5}]) as run:
+        dashboard = bigquery_tools.run_cost_dashboard()
+
+    assert run.call_count == 4
+    assert dashboard["cache_performance"] == {"total_requests": 5}
+    assert dashboard["service_costs"] == [{"total_requests": 5}]
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from src import vertex_gemini
+
+VALID_KEY = "AIza" + "a" * 35
+OTHER_KEY = "AIza" + "b" * 35
+
+
+class FakeGenerativeModel:
+    """Stands in for vertexai.generative_models.GenerativeModel and records each request."""
+
+    calls = []
+    gate = None
+
+    def __init__(self, name):
+        self.name = name
+
+    def generate_content(self, contents, stream=False):
+        if FakeGenerativeModel.gate is not None:
+            FakeGenerativeModel.gate.wait(timeout=5)
+        FakeGenerativeModel.calls.append(contents)
+        return [types.SimpleNamespace(text=f"reply {len(FakeGenerativeModel.calls)}")]
+
+    async def generate_content_async(self, contents):
+        FakeGenerativeModel.calls.append(contents)
+        return types.SimpleNamespace(text=f"reply to {contents}")
+
+
+@pytest.fixture
+def fake_vertexai(monkeypatch):
+    """Installs a fake vertexai package and resets the shared model cache around the test."""
+    generative_models = types.ModuleType("vertexai.generative_models")
+    generative_models.GenerativeModel = FakeGenerativeModel
+    vertexai = types.ModuleType("vertexai")
+    vertexai.init = MagicMock()
+    vertexai.generative_models = generative_models
+    monkeypatch.setitem(sys.modules, "vertexai", vertexai)
+    monkeypatch.setitem(sys.modules, "vertexai.generative_models", generative_models)
+    monkeypatch.setattr(FakeGenerativeModel, "calls", [])
+    monkeypatch.setattr(FakeGenerativeModel, "gate", None)
+    vertex_gemini._get_vertex_model.cache_clear()
+
+    yield vertexai
+    vertex_gemini._get_vertex_model.cache_clear()
+
+
+@pytest.fixture
+def vertex_client(fake_vertexai, monkeypatch):
+    """A VertexGeminiClient backed by the fake vertexai package, with no disk cache."""
+    monkeypatch.delenv("VERTEX_GEMINI_CACHE_DIR", raising=False)
+    return vertex_gemini.VertexGeminiClient("test-project", "us-central1")
+
+
+def test_vertex_model_cache_is_per_project_and_location(fake_vertexai):
+    """Test that bare model IDs are pinned to their pair and shared only within it."""
+    first = vertex_gemini._get_vertex_model("p1", "us-central1", "gemini")
+
+    assert vertex_gemini._get_vertex_model("p1", "us-central1", "gemini") is first
+    assert vertex_gemini._get_vertex_model("p2", "us-central1", "gemini") is not first
+    assert first.name == "projects/p1/locations/us-central1/publishers/google/models/gemini"
+
+
+@pytest.mark.parametrize("name", [
+    "models/gemini-2.0-flash",
+    "projects/p/locations/europe-west4/endpoints/123",
+])
+def test_vertex_model_keeps_qualified_names(fake_vertexai, name):
+    """Test that names that already carry a path are passed through unchanged."""
+    assert vertex_gemini._get_vertex_model("p1", "us-central1", name).name == name
+
+
+def test_generate_content_batch_preserves_order(vertex_client):
+    """Test that the sync batch wrapper returns one response per prompt, in order."""
+    responses = vertex_client.models.generate_content_batch("gemini", ["a", "b", "c"], max_concurrency=2)
+
+    assert [r.text for r in responses] == ["reply to a", "reply to b", "reply to c"]
+
+
+def test_agenerate_content_batch_from_event_loop(vertex_client, recwarn):
+    """Test that async callers await the batch directly, and the sync wrapper refuses to nest."""
+    async def run():
+        with pytest.raises(RuntimeError, match="agenerate_content_batch"):
+            vertex_client.models.generate_content_batch("gemini", ["a"])
+        return await vertex_client.models.agenerate_content_batch("gemini", ["a", "b"])
+
+    responses = asyncio.run(run())
+
+    assert [r.text for r in responses] == ["reply to a", "reply to b"]
+    assert not [w for w in recwarn if "never awaited" in str(w.message)]
+
+
+def _batch_row(text, reply=None, status=""):
+    row = {"request": {"contents": [{"role": "user", "parts": [{"text": text}]}]}, "status": status}
+    if reply is not None:
+        row["response"] = {"candidates": [{"content": {"parts": [{"text": reply}]}}]}
+    return json.dumps(row)
+
+
+@pytest.fixture
+def batch_output(fake_vertexai, monkeypatch):
+    """Fakes GCS and BatchPredictionJob; the returned list holds the output JSONL lines."""
+    import google.cloud
+
+    lines = []
+    blob = MagicMock()
+    blob.name = "prefix/output/predictions.jsonl"
+    blob.download_as_text.side_effect = lambda: "\n".join(lines)
+    storage = types.SimpleNamespace(Client=MagicMock())
+    storage.Client.return_value.bucket.return_value.list_blobs.return_value = [blob]
+    monkeypatch.setattr(google.cloud, "storage", storage, raising=False)
+    monkeypatch.setitem(sys.modules, "google.cloud.storage", storage)
+
+    job = MagicMock(has_ended=True, has_succeeded=True, output_location="gs://bucket/prefix/output")
+    batch_prediction = types.ModuleType("vertexai.batch_prediction")
+    batch_prediction.BatchPredictionJob = MagicMock(**{"submit.return_value": job})
+    monkeypatch.setitem(sys.modules, "vertexai.batch_prediction", batch_prediction)
+    return lines
+
+
+def test_generate_content_batch_job_matches_rows_to_prompts(vertex_client, batch_output):
+    """Test that unordered output rows are matched back to prompts, duplicates included."""
+    batch_output.extend([_batch_row("b", "B"), _batch_row("a", "A1"), _batch_row("a", "A2")])
+
+    responses = vertex_client.models.generate_content_batch_job("gemini", ["a", "b", "a"], "gs://bucket/prefix")
+
+    assert [r.text for r in responses] == ["A1", "B", "A2"]
+
+
+def test_generate_content_batch_job_raises_on_failed_and_missing_rows(vertex_client, batch_output):
+    """Test that failed rows and prompts without output are reported together."""
+    batch_output.extend([_batch_row("a", "A"), _batch_row("b", status="Quota exceeded")])
+
+    with pytest.raises(RuntimeError, match=r"2 of 3 prompts \(#1: Quota exceeded; #2: missing from job output\)"):
+        vertex_client.models.generate_content_batch_job("gemini", ["a", "b", "c"], "gs://bucket/prefix")
+
+
+def test_generate_content_cache_hit_and_sample_index(vertex_client):
+    """Test that repeated calls hit the cache and each sample_index is its own entry."""
+    first = vertex_client.models.generate_content("gemini", "hello")
+    again = vertex_client.models.generate_content("gemini", "hello")
+    sample = vertex_client.models.generate_content("gemini", "hello", sample_index=1)
+
+    assert again is first
+    assert sample.text != first.text
+    assert FakeGenerativeModel.calls == ["hello", "hello"]
+
+
+def test_generate_content_cache_evicts_least_recently_used(vertex_client):
+    """Test that the in-memory cache stays within its size bound."""
+    vertex_client.models._cache_size = 2
+    for prompt in ("a", "b", "a", "c", "a", "b"):
+        vertex_client.models.generate_content("gemini", prompt)
+
+    # "b" was evicted by "c", so it is the only prompt requested twice
+    assert FakeGenerativeModel.calls == ["a", "b", "c", "b"]
+
+
+def test_generate_content_disk_cache_shared_across_clients(fake_vertexai, monkeypatch, tmp_path):
+    """Test that a response written to the disk cache serves a fresh client, with no temp files left."""
+    monkeypatch.setenv("VERTEX_GEMINI_CACHE_DIR", str(tmp_path))
+    first = vertex_gemini.VertexGeminiClient("test-project", "us-central1")
+    second = vertex_gemini.VertexGeminiClient("test-project", "us-central1")
+
+    assert first.models.generate_content("gemini", "hello").text == "reply 1"
+    assert second.models.generate_content("gemini", "hello").text == "reply 1"
+    assert FakeGenerativeModel.calls == ["hello"]
+    assert [p.suffix for p in tmp_path.iterdir()] == [".json"]
+
+
+def test_round_robin_client_rotates():
+    """Test that requests are spread across the clients in turn."""
+    clients = [MagicMock(), MagicMock()]
+    client = vertex_gemini.RoundRobinGenaiClient(clients)
+
+    for _ in range(3):
+        client.models.generate_content(model="gemini", contents="hi")
+    client.models.count_tokens(model="gemini", contents="hi")
+
+    assert clients[0].models.generate_content.call_count == 2
+    assert clients[1].models.generate_content.call_count == 1
+    clients[1].models.count_tokens.assert_called_once_with(model="gemini", contents="hi")
+
+
+def test_generate_content_coalesces_concurrent_calls(vertex_client):
+    """Test that identical concurrent calls share one in-flight request."""
+    FakeGenerativeModel.gate = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        futures = [ex.submit(vertex_client.models.generate_content, "gemini", "same") for _ in range(4)]
+        # Hold the first request open until the other callers have queued behind it
+        while not vertex_client.models._inflight:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        FakeGenerativeModel.gate.set()
+        results = [f.result(timeout=5) for f in futures]
+
+    assert FakeGenerativeModel.calls == ["same"]
+    assert {r.text for r in results} == {"reply 1"}
+
+
+def test_token_bucket_waits_once_burst_is_spent(monkeypatch):
+    """Test that the bucket admits a burst up to its rate, then sleeps for the next token."""
+    clock = [100.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(vertex_gemini.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(vertex_gemini.time, "sleep", sleep)
+    bucket = vertex_gemini._TokenBucket(2)
+
+    for _ in range(3):
+        bucket.acquire()
+
+    assert sleeps == [pytest.approx(0.5)]
+
+
+@pytest.mark.parametrize("qpm, expected", [(None, None), (120, 2)])
+def test_rate_limiter_is_opt_in(monkeypatch, qpm, expected):
+    """Test that throttling is off unless GEMINI_QPM is set."""
+    from src.config import settings
+
+    monkeypatch.setattr(settings, "GEMINI_QPM", qpm)
+    vertex_gemini._rate_limiter.cache_clear()
+    try:
+        limiter = vertex_gemini._rate_limiter()
+        assert (limiter and limiter._rate) == expected
+    finally:
+        vertex_gemini._rate_limiter.cache_clear()
+
+
+def test_rate_limited_requests_are_retried(vertex_client, monkeypatch):
+    """Test that 429s are retried with backoff and other errors are not."""
+    from google.api_core.exceptions import ResourceExhausted
+
+    monkeypatch.setattr(vertex_client.models._request_text.retry, "sleep", lambda seconds: None)
+    outcomes = [ResourceExhausted("429"), ResourceExhausted("429")]
+
+    def generate_content(self, contents, stream=False):
+        if outcomes:
+            raise outcomes.pop(0)
+        return [types.SimpleNamespace(text="ok")]
+
+    monkeypatch.setattr(FakeGenerativeModel, "generate_content", generate_content)
+    assert vertex_client.models.generate_content("gemini", "hello").text == "ok"
+
+    outcomes.append(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        vertex_client.models.generate_content("gemini", "other")
+    assert not outcomes
+
+
+def test_api_keys_prefers_list_and_filters():
+    """Test that GOOGLE_API_KEYS wins over GOOGLE_API_KEY and malformed keys are dropped."""
+    assert vertex_gemini._api_keys(f" {VALID_KEY}, not-a-key ,{OTHER_KEY},", "ignored") == (VALID_KEY, OTHER_KEY)
+    assert vertex_gemini._api_keys("", f" {VALID_KEY} ") == (VALID_KEY,)
+
+
+def test_api_keys_placeholder_is_unset(caplog):
+    """Test that the install.sh placeholder is treated as no key, without a warning."""
+    assert vertex_gemini._api_keys("", "your_api_key_here") == ()
+    assert vertex_gemini._api_keys("", "") == ()
+    assert "malformed" not in caplog.text
+
+
+def test_api_keys_warns_about_malformed_key_once(caplog):
+    """Test that a malformed key is reported once per process, not on every lookup."""
+    vertex_gemini._api_keys.cache_clear()
+    for _ in range(3):
+        assert vertex_gemini._api_keys("", "not-a-key") == ()
+
+    assert caplog.text.count("malformed") == 1